@@ -8,7 +8,7 @@ import time
 import threading
 from ctypes import wintypes
 
-from PySide6.QtCore import Qt, QTimer, QSize, QUrl, QPropertyAnimation
+from PySide6.QtCore import Qt, QTimer, QSize, QUrl, QPropertyAnimation, Signal
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QLabel, QPushButton, QVBoxLayout,
     QHBoxLayout, QWidget, QDialog, QLineEdit, QDialogButtonBox,
@@ -17,6 +17,8 @@ from PySide6.QtWidgets import (
 from PySide6.QtGui import QIcon, QAction, QPixmap, QFont, QColor, QPainter
 from PySide6.QtMultimedia import QMediaPlayer, QAudioOutput
 
+from pomodoro_sync import HistoryStore, SyncClient, SyncWorker
+
 # ---------- Windows API setup (ctypes, no external deps) ----------
 
 user32 = ctypes.windll.user32
@@ -81,13 +83,16 @@ def get_active_process_name():
 # Use exe directory for bundled app, script directory for development
 if getattr(sys, 'frozen', False):
     SETTINGS_FILE = os.path.join(os.path.dirname(sys.executable), "pomodoro_settings.json")
+    HISTORY_FILE = os.path.join(os.path.dirname(sys.executable), "pomodoro_history.json")
 else:
     SETTINGS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pomodoro_settings.json")
+    HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pomodoro_history.json")
 
 DEFAULT_SETTINGS = {
     "right_apps": ["blender", "houdini"],
     "work_minutes": 25,
-    "break_minutes": 5
+    "break_minutes": 5,
+    "sync_url": ""  # e.g. "http://127.0.0.1:8765"; empty disables sync
 }
 
 
@@ -169,6 +174,9 @@ class SettingsDialog(QDialog):
 # ---------- Main window ----------
 
 class PomodoroWindow(QMainWindow):
+    # Emitted from the sync thread; Qt delivers it on the UI thread
+    history_synced = Signal()
+
     def __init__(self):
         super().__init__()
 
@@ -195,9 +203,11 @@ class PomodoroWindow(QMainWindow):
         self.break_total_seconds = self.settings["break_minutes"] * 60
         self.remaining_seconds = self.work_total_seconds
 
-        # Garden: always 5 slots
-        self.session_count = 0
-        self.garden = [PLANT] * 5
+        # Garden: always 5 slots, restored (and synced) from local history
+        self.history = HistoryStore(HISTORY_FILE, slots=5)
+        self.session_count = self.history.session_count()
+        self.garden = self.history.garden(PLANT)
+        self.sync_worker = None
 
         self.label_plants = QLabel("".join(self.garden))
         self.label_plants.setAlignment(Qt.AlignCenter)
@@ -248,6 +258,10 @@ class PomodoroWindow(QMainWindow):
         tray_menu.addAction(quit_action)
         self.tray_icon.setContextMenu(tray_menu)
 
+        self.history_synced.connect(self.refresh_garden_from_history)
+        QApplication.instance().aboutToQuit.connect(self.stop_sync)
+        self.start_sync()
+
         # Initialize media player for MP3 playback
         self.media_player = QMediaPlayer(self)
         self.audio_output = QAudioOutput(self)
@@ -617,8 +631,6 @@ class PomodoroWindow(QMainWindow):
                 self.label_time.setText(time_display)
 
     def update_garden_after_session(self):
-        self.session_count += 1
-
         # From session 1 onward: replace one seedling; when none left, mutate a flower
         seedling_positions = [i for i, x in enumerate(self.garden) if x == PLANT]
 
@@ -629,8 +641,36 @@ class PomodoroWindow(QMainWindow):
             pos = random.randrange(5)
             self.garden[pos] = random.choice(FLOWERS)
 
+        # Recorded locally; the sync thread ships it whenever it can
+        try:
+            self.history.record_session(pos, self.garden[pos])
+        except Exception:
+            pass  # History file not writable; the session stays in memory and syncs later
+
+        # Show the merged state so the window always agrees with history
+        self.refresh_garden_from_history()
+        if self.sync_worker:
+            self.sync_worker.notify()
+
+    def refresh_garden_from_history(self):
+        """Pick up sessions and flowers merged in from other devices."""
+        self.session_count = self.history.session_count()
+        self.garden = self.history.garden(PLANT)
         self.label_plants.setText("".join(self.garden))
 
+    def start_sync(self):
+        url = self.settings.get("sync_url", "")
+        if not url:
+            return
+        client = SyncClient(self.history, url)
+        self.sync_worker = SyncWorker(client, on_synced=self.history_synced.emit)
+        self.sync_worker.start()
+
+    def stop_sync(self):
+        if self.sync_worker:
+            self.sync_worker.stop()
+            self.sync_worker = None
+
     def show_notification(self, title, message):
         self.tray_icon.showMessage(title, message, QSystemTrayIcon.Information, 5000)
 
@@ -0,0 +1,606 @@
+"""Offline-first history sync for Cotton Eye Pomodoro.
+
+Completed sessions are recorded locally first and shipped to a sync server
+later, in compressed batches, from a background thread. Only events newer
+than the last acknowledged checkpoint ever leave the machine.
+
+Run a local stand-in server:      python pomodoro_sync.py serve
+Measure a month of backlog:       python pomodoro_sync.py bench
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8765
+BATCH_SIZE = 200
+SYNC_INTERVAL_SECONDS = 60
+BACKOFF_BASE_SECONDS = 2
+BACKOFF_MAX_SECONDS = 300
+
+
+class SyncError(Exception):
+    """Raised when the server sends something we cannot use."""
+
+
+# ---------- Wire format ----------
+
+def encode_payload(obj):
+    """Return (raw_json_bytes, deflated_bytes) for a payload."""
+    raw = json.dumps(obj, separators=(",", ":")).encode("utf-8")
+    return raw, zlib.compress(raw, 6)
+
+
+def decode_payload(data):
+    """Return (payload, raw_json_length) for deflated bytes."""
+    try:
+        raw = zlib.decompress(data)
+        return json.loads(raw.decode("utf-8")), len(raw)
+    except (zlib.error, UnicodeDecodeError, ValueError) as exc:
+        raise SyncError(f"bad payload: {exc}") from exc
+
+
+# ---------- Local history ----------
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_event(event):
+    """Local event: [seq, ts, slot, flower]."""
+    return (
+        isinstance(event, list) and len(event) == 4
+        and _is_int(event[0]) and _is_number(event[1])
+        and _is_int(event[2]) and isinstance(event[3], str)
+    )
+
+
+def _is_garden_entry(entry):
+    """Garden slot: [[ts, device, seq], flower]."""
+    if not (isinstance(entry, list) and len(entry) == 2 and isinstance(entry[1], str)):
+        return False
+    stamp = entry[0]
+    return (
+        isinstance(stamp, list) and len(stamp) == 3
+        and _is_number(stamp[0]) and isinstance(stamp[1], str) and _is_int(stamp[2])
+    )
+
+
+class HistoryStore:
+    """Local session/garden history, merged deterministically across devices.
+
+    Every completed session is an event ``[seq, ts, slot, flower]`` owned by
+    this device. Merging is order independent:
+
+    - session count: each device's highest seq, summed over devices
+    - garden: per slot, the flower from the event with the highest
+      ``(ts, device, seq)`` stamp wins
+
+    Other devices' events are folded into the merged state and dropped. This
+    device's own events are kept, so they can be resent if the server loses
+    its log; everything after `acked` is still waiting to be sent.
+    """
+
+    def __init__(self, path, slots=5):
+        self.path = path
+        self.slots = slots
+        self.lock = threading.Lock()
+
+        self.device_id = uuid.uuid4().hex
+        self.next_seq = 1
+        self.log_id = None
+        self.cursor = 0
+        self.acked = 0
+        self.own_events = []
+        self.counts = {}
+        self.garden_slots = [None] * slots
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            return
+        if not isinstance(data, dict):
+            return
+
+        # Anything malformed falls back to the defaults, like load_settings
+        device_id = data.get("device_id")
+        if isinstance(device_id, str) and device_id:
+            self.device_id = device_id
+
+        log_id = data.get("log_id")
+        if isinstance(log_id, str):
+            self.log_id = log_id
+
+        cursor = data.get("cursor")
+        if _is_int(cursor) and cursor >= 0:
+            self.cursor = cursor
+
+        acked = data.get("acked")
+        if _is_int(acked) and acked >= 0:
+            self.acked = acked
+
+        own_events = data.get("own_events")
+        if isinstance(own_events, list):
+            self.own_events = [e for e in own_events if _is_event(e)]
+
+        next_seq = data.get("next_seq")
+        if _is_int(next_seq) and next_seq >= 1:
+            self.next_seq = next_seq
+        if self.own_events:
+            self.next_seq = max(self.next_seq, self.own_events[-1][0] + 1)
+
+        counts = data.get("counts")
+        if isinstance(counts, dict):
+            self.counts = {d: n for d, n in counts.items() if _is_int(n) and n >= 0}
+
+        garden = data.get("garden")
+        if isinstance(garden, list):
+            for i, entry in enumerate(garden[:self.slots]):
+                if _is_garden_entry(entry):
+                    self.garden_slots[i] = entry
+
+    def _save(self):
+        data = {
+            "device_id": self.device_id,
+            "next_seq": self.next_seq,
+            "log_id": self.log_id,
+            "cursor": self.cursor,
+            "acked": self.acked,
+            "own_events": self.own_events,
+            "counts": self.counts,
+            "garden": self.garden_slots,
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def _fold(self, device, seq, ts, slot, flower):
+        """Merge one event into the materialized state. Returns True if it changed."""
+        changed = False
+        if seq > self.counts.get(device, 0):
+            self.counts[device] = seq
+            changed = True
+        if not 0 <= slot < self.slots:
+            return changed
+        stamp = [ts, device, seq]
+        current = self.garden_slots[slot]
+        if current is None or stamp > current[0]:
+            self.garden_slots[slot] = [stamp, flower]
+            changed = True
+        return changed
+
+    def record_session(self, slot, flower, ts=None):
+        """Record a completed session that planted `flower` in `slot`.
+
+        The stamp is nudged past whatever already holds the slot, so a local
+        planting always wins even if another device's clock runs ahead.
+        """
+        if ts is None:
+            ts = time.time()
+        with self.lock:
+            current = self.garden_slots[slot] if 0 <= slot < self.slots else None
+            if current is not None and ts <= current[0][0]:
+                ts = current[0][0] + 0.001
+            seq = self.next_seq
+            self.next_seq += 1
+            self._fold(self.device_id, seq, ts, slot, flower)
+            self.own_events.append([seq, ts, slot, flower])
+            self._save()
+
+    @property
+    def pending(self):
+        """Own events the server has not acknowledged yet."""
+        with self.lock:
+            return [e for e in self.own_events if e[0] > self.acked]
+
+    def session_count(self):
+        with self.lock:
+            return sum(self.counts.values())
+
+    def garden(self, placeholder):
+        with self.lock:
+            return [placeholder if s is None else s[1] for s in self.garden_slots]
+
+    def snapshot(self):
+        """Merged state as plain data, for comparing devices."""
+        with self.lock:
+            return {"counts": dict(self.counts), "garden": list(self.garden_slots)}
+
+    def pending_batch(self, limit):
+        """Return (oldest `limit` unacknowledged events, log id, server cursor)."""
+        with self.lock:
+            events = [e for e in self.own_events if e[0] > self.acked][:limit]
+            return events, self.log_id, self.cursor
+
+    def apply_reply(self, reply):
+        """Advance the ack, merge remote events and move the cursor.
+
+        Returns True if remote events changed the merged state. The file is
+        only rewritten when something actually moved.
+        """
+        with self.lock:
+            changed = False
+            for device, seq, ts, slot, flower in reply["events"]:
+                if device != self.device_id:
+                    changed = self._fold(device, seq, ts, slot, flower) or changed
+
+            dirty = changed
+            if reply["ack"] > self.acked:
+                self.acked = reply["ack"]
+                dirty = True
+            if reply["cursor"] != self.cursor:
+                self.cursor = reply["cursor"]
+                dirty = True
+            if dirty:
+                self._save()
+            return changed
+
+    def reset_log(self, log_id):
+        """The server's log is new (e.g. it restarted): resend and re-pull everything."""
+        with self.lock:
+            self.log_id = log_id
+            self.cursor = 0
+            self.acked = 0
+            self._save()
+
+    def reassign_device(self, acked):
+        """Another install shares our device id; move unsent events to a fresh one.
+
+        Events up to `acked` matched what the server stored (they predate the
+        copy), so they stay with the old id. The rest are renumbered.
+        """
+        with self.lock:
+            self.acked = max(self.acked, acked)
+            old_id = self.device_id
+            self.device_id = uuid.uuid4().hex
+
+            renumbered = {}
+            own_events = []
+            for seq, ts, slot, flower in self.own_events:
+                if seq > self.acked:
+                    renumbered[seq] = len(own_events) + 1
+                    own_events.append([renumbered[seq], ts, slot, flower])
+            self.own_events = own_events
+            self.next_seq = len(own_events) + 1
+
+            self.counts[old_id] = self.acked
+            if own_events:
+                self.counts[self.device_id] = len(own_events)
+            for entry in self.garden_slots:
+                if entry is not None and entry[0][1] == old_id and entry[0][2] in renumbered:
+                    entry[0] = [entry[0][0], self.device_id, renumbered[entry[0][2]]]
+
+            # Pull the old id's events from the start; they now belong to someone else
+            self.acked = 0
+            self.cursor = 0
+            self._save()
+
+
+# ---------- Client ----------
+
+class SyncClient:
+    """Pushes local deltas and pulls remote ones over HTTP, one batch at a time."""
+
+    def __init__(self, store, url, batch_size=BATCH_SIZE, timeout=10):
+        self.store = store
+        self.url = url.rstrip("/") + "/sync"
+        self.batch_size = batch_size
+        self.timeout = timeout
+
+        self.batches = 0
+        self.events_sent = 0
+        self.events_received = 0
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+
+    def _post(self, payload):
+        raw, body = encode_payload(payload)
+        request = urllib.request.Request(
+            self.url,
+            data=body,
+            headers={"Content-Type": "application/json", "Content-Encoding": "deflate"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            data = response.read()
+        reply, raw_reply_length = decode_payload(data)
+        self.raw_bytes += len(raw) + raw_reply_length
+        self.wire_bytes += len(body) + len(data)
+        return reply
+
+    def sync_once(self):
+        """Sync until both sides are drained. Returns True if remote events arrived."""
+        changed = False
+        resyncs = 0
+        while True:
+            events, log_id, cursor = self.store.pending_batch(self.batch_size)
+            reply = self._post({
+                "device": self.store.device_id,
+                "log_id": log_id,
+                "since": cursor,
+                "limit": self.batch_size,
+                "events": events,
+            })
+            self.batches += 1
+            try:
+                if reply.get("reset") or reply.get("conflict"):
+                    # One of each is expected at most; more means the server is confused
+                    resyncs += 1
+                    if resyncs > 2:
+                        raise SyncError("server keeps asking for a resync")
+                    if reply.get("conflict"):
+                        self.store.reassign_device(reply["ack"])
+                    else:
+                        self.store.reset_log(reply["log_id"])
+                    continue
+
+                if events and reply["ack"] < events[-1][0]:
+                    raise SyncError("server did not accept the batch")
+                changed = self.store.apply_reply(reply) or changed
+                more = reply["more"]
+            except (AttributeError, KeyError, TypeError, ValueError) as exc:
+                raise SyncError(f"bad reply: {exc!r}") from exc
+
+            self.events_sent += len(events)
+            self.events_received += len(reply["events"])
+
+            if len(events) < self.batch_size and not more:
+                return changed
+
+
+def backoff_delay(failures, base=BACKOFF_BASE_SECONDS, cap=BACKOFF_MAX_SECONDS):
+    """Exponential backoff with jitter for the n-th consecutive failure."""
+    delay = min(cap, base * 2 ** (failures - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class SyncWorker(threading.Thread):
+    """Background thread that runs the client on demand and on an interval.
+
+    `notify()` is cheap and safe to call from the UI thread; it only wakes the
+    worker. While backing off after a failure, notifications are ignored so a
+    burst of sessions cannot hammer an unreachable server.
+    """
+
+    def __init__(self, client, on_synced=None, interval=SYNC_INTERVAL_SECONDS):
+        super().__init__(name="pomodoro-sync", daemon=True)
+        self.client = client
+        self.on_synced = on_synced
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+    def notify(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def run(self):
+        failures = 0
+        while not self._stopped.is_set():
+            self._wake.clear()
+            try:
+                changed = self.client.sync_once()
+            except Exception:
+                # Network, HTTP protocol or disk trouble: never let the thread die
+                failures += 1
+                self._stopped.wait(backoff_delay(failures))
+                continue
+
+            failures = 0
+            if changed and self.on_synced:
+                self.on_synced()
+            self._wake.wait(self.interval)
+
+
+# ---------- Local stand-in server ----------
+
+class SyncLog:
+    """Server-side append-only event log shared by all devices.
+
+    The log lives in memory only. Its random `log_id` is sent with every reply
+    so clients notice a restarted server and resend their history.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.log_id = uuid.uuid4().hex
+        self.events = []
+        self.stored = {}
+
+    def handle(self, request):
+        device = request["device"]
+        log_id = request["log_id"]
+        since = request["since"]
+        limit = request["limit"]
+        events = request["events"]
+        # Validate everything before touching the log, so a bad batch leaves no trace
+        if not (isinstance(device, str) and device):
+            raise ValueError("bad device")
+        if not (log_id is None or isinstance(log_id, str)):
+            raise ValueError("bad log_id")
+        if not (_is_int(since) and since >= 0 and _is_int(limit) and limit >= 1):
+            raise ValueError("bad cursor or limit")
+        if not (isinstance(events, list) and all(_is_event(e) for e in events)):
+            raise ValueError("bad events")
+
+        with self.lock:
+            if log_id != self.log_id or since > len(self.events):
+                return {"log_id": self.log_id, "reset": True}
+
+            # A retried event is acknowledged only if it matches what was stored;
+            # a different event under the same (device, seq) means a copied install
+            matched = 0
+            for event in events:
+                stored = self.stored.get((device, event[0]))
+                if stored is None:
+                    break
+                if stored[1:] != event:
+                    return {"log_id": self.log_id, "conflict": True, "ack": matched}
+                matched = event[0]
+
+            for event in events:
+                key = (device, event[0])
+                if key not in self.stored:
+                    self.stored[key] = [device] + event
+                    self.events.append(self.stored[key])
+
+            out = []
+            cursor = since
+            while cursor < len(self.events) and len(out) < limit:
+                event = self.events[cursor]
+                if event[0] != device:
+                    out.append(event)
+                cursor += 1
+
+            return {
+                "log_id": self.log_id,
+                "ack": events[-1][0] if events else 0,
+                "cursor": cursor,
+                "more": cursor < len(self.events),
+                "events": out,
+            }
+
+
+class _SyncHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.path != "/sync":
+            self.send_error(404)
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request, _ = decode_payload(self.rfile.read(length))
+            reply = self.server.log.handle(request)
+        except (SyncError, KeyError, TypeError, ValueError):
+            self.send_error(400)
+            return
+
+        _, body = encode_payload(reply)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Encoding", "deflate")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep the console quiet
+
+
+class SyncServer(ThreadingHTTPServer):
+    """In-memory stand-in for the real sync server. Port 0 picks a free port."""
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT):
+        super().__init__((host, port), _SyncHandler)
+        self.log = SyncLog()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+# ---------- Command line ----------
+
+BENCH_FLOWERS = ["🌸", "🌹", "🌺", "🌻", "🌼", "🌷"]
+
+
+def fill_backlog(store, days, per_day, start):
+    """Record `days` worth of sessions, `per_day` each, starting at `start`."""
+    for day in range(days):
+        for n in range(per_day):
+            ts = start + day * 86400 + n * 1800
+            store.record_session(random.randrange(store.slots), random.choice(BENCH_FLOWERS), ts=ts)
+
+
+def run_bench(days, per_day, batch_size):
+    server = SyncServer(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.time() - days * 86400
+        workstation = HistoryStore(os.path.join(tmp, "workstation.json"))
+        laptop = HistoryStore(os.path.join(tmp, "laptop.json"))
+        fill_backlog(workstation, days, per_day, start)
+        fill_backlog(laptop, days, max(1, per_day // 3), start + 900)
+
+        clients = [
+            ("workstation push", SyncClient(workstation, server.url, batch_size)),
+            ("laptop push+pull", SyncClient(laptop, server.url, batch_size)),
+            ("workstation pull", SyncClient(workstation, server.url, batch_size)),
+        ]
+        for name, client in clients:
+            began = time.perf_counter()
+            client.sync_once()
+            elapsed = time.perf_counter() - began
+            events = client.events_sent + client.events_received
+            print(
+                f"{name:18} {events:6d} events {client.batches:4d} batches "
+                f"{elapsed * 1000:8.1f} ms {events / elapsed:10.0f} ev/s "
+                f"{client.raw_bytes:9d} B raw {client.wire_bytes:8d} B wire "
+                f"({client.wire_bytes / max(1, client.raw_bytes):.0%})"
+            )
+
+        converged = workstation.snapshot() == laptop.snapshot()
+        print(f"sessions: {workstation.session_count()}  converged: {'yes' if converged else 'NO'}")
+
+    server.shutdown()
+    server.server_close()
+    return converged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="run the local stand-in sync server")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+
+    bench = sub.add_parser("bench", help="sync a month of backlog between two devices")
+    bench.add_argument("--days", type=int, default=30)
+    bench.add_argument("--per-day", type=int, default=12)
+    bench.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        server = SyncServer(args.host, args.port)
+        print(f"Sync server listening on {server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        server.server_close()
+    else:
+        raise SystemExit(0 if run_bench(args.days, args.per_day, args.batch_size) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import pomodoro_sync
+from pomodoro_sync import HistoryStore, SyncClient, SyncLog, SyncServer, SyncWorker
+
+
+def start_server():
+    server = SyncServer(port=0)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    return server
+
+
+def stop_server(server):
+    server.shutdown()
+    server.server_close()
+
+
+class SyncTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.server = start_server()
+        self.addCleanup(stop_server, self.server)
+
+    def store(self, name):
+        return HistoryStore(os.path.join(self.tmp, name + ".json"))
+
+    def client(self, store, **kwargs):
+        return SyncClient(store, self.server.url, **kwargs)
+
+    def assertConverged(self, stores, sessions):
+        snapshots = [s.snapshot() for s in stores]
+        for snapshot in snapshots[1:]:
+            self.assertEqual(snapshot, snapshots[0])
+        for s in stores:
+            self.assertEqual(s.session_count(), sessions)
+            self.assertEqual(s.pending, [])
+
+
+class TestConvergence(SyncTestCase):
+    def test_random_interleaving_converges(self):
+        rng = random.Random(1234)
+        for trial in range(10):
+            self.server.log = SyncLog()
+            stores = [self.store(f"{trial}-{i}") for i in range(3)]
+            clients = [self.client(s, batch_size=rng.randint(1, 7)) for s in stores]
+            recorded = 0
+            for _ in range(60):
+                i = rng.randrange(3)
+                if rng.random() < 0.6:
+                    stores[i].record_session(rng.randrange(5), rng.choice("abc"), ts=rng.uniform(0, 100))
+                    recorded += 1
+                else:
+                    clients[i].sync_once()
+            for _ in range(2):
+                for c in clients:
+                    c.sync_once()
+            self.assertConverged(stores, recorded)
+
+    def test_merge_is_order_independent(self):
+        events = [
+            ["a", 1, 10.0, 0, "x"], ["a", 2, 30.0, 1, "y"],
+            ["b", 1, 20.0, 0, "z"], ["b", 2, 30.0, 1, "w"],
+            ["c", 1, 5.0, 9, "out of range"],
+        ]
+        snapshots = []
+        for n in range(5):
+            shuffled = list(events)
+            random.Random(n).shuffle(shuffled)
+            s = self.store(f"order-{n}")
+            for event in shuffled:
+                s.apply_reply({"ack": 0, "cursor": 0, "events": [event]})
+            snapshots.append(s.snapshot())
+        for snapshot in snapshots[1:]:
+            self.assertEqual(snapshot, snapshots[0])
+        self.assertEqual(s.session_count(), 5)
+        self.assertEqual(s.garden("_"), ["z", "w", "_", "_", "_"])
+
+    def test_local_planting_wins_over_clock_skew(self):
+        s = self.store("skew")
+        s.apply_reply({"ack": 0, "cursor": 1, "events": [["other", 1, time.time() + 3600, 0, "R"]]})
+        s.record_session(0, "L")
+        self.assertEqual(s.garden("_")[0], "L")
+
+
+class TestServerLog(SyncTestCase):
+    def request(self, events, device="a", since=0):
+        return {"device": device, "log_id": self.log.log_id, "since": since, "limit": 50, "events": events}
+
+    def setUp(self):
+        super().setUp()
+        self.log = SyncLog()
+
+    def test_retried_batch_is_deduplicated(self):
+        batch = [[1, 1.0, 0, "x"], [2, 2.0, 1, "y"]]
+        first = self.log.handle(self.request(batch))
+        second = self.log.handle(self.request(batch))
+        self.assertEqual(first["ack"], 2)
+        self.assertEqual(second["ack"], 2)
+        self.assertEqual(len(self.log.events), 2)
+
+    def test_malformed_batch_leaves_no_trace(self):
+        with self.assertRaises(ValueError):
+            self.log.handle(self.request([[1, 1.0, 0, "x"], [2, "bad"]]))
+        self.assertEqual(self.log.events, [])
+        self.log.handle(self.request([[1, 1.0, 0, "x"]]))
+        self.assertEqual(len(self.log.events), 1)
+
+    def test_unknown_log_or_cursor_asks_for_reset(self):
+        reply = self.log.handle(dict(self.request([]), log_id="stale"))
+        self.assertTrue(reply["reset"])
+        reply = self.log.handle(self.request([], since=5))
+        self.assertTrue(reply["reset"])
+
+    def test_same_seq_different_event_is_a_conflict(self):
+        self.log.handle(self.request([[1, 1.0, 0, "x"], [2, 2.0, 1, "y"]]))
+        reply = self.log.handle(self.request([[1, 1.0, 0, "x"], [2, 3.0, 2, "z"]]))
+        self.assertTrue(reply["conflict"])
+        self.assertEqual(reply["ack"], 1)
+        self.assertEqual(len(self.log.events), 2)
+
+
+class TestDataLoss(SyncTestCase):
+    def test_server_restart_resends_history(self):
+        work, laptop = self.store("work"), self.store("laptop")
+        for n in range(4):
+            work.record_session(n, "w")
+        laptop.record_session(4, "l")
+        self.client(work).sync_once()
+        self.client(laptop).sync_once()
+
+        # Restart: same clients, empty log
+        stop_server(self.server)
+        self.server = start_server()
+        laptop.record_session(0, "L")
+        self.client(laptop).sync_once()
+        self.client(work).sync_once()
+        self.client(laptop).sync_once()
+
+        self.assertConverged([work, laptop], 6)
+        self.assertEqual(len(self.server.log.events), 6)
+
+    def test_copied_install_gets_a_new_device_id(self):
+        work = self.store("work")
+        work.record_session(0, "x")
+        self.client(work).sync_once()
+        shutil.copy(work.path, os.path.join(self.tmp, "laptop.json"))
+        laptop = self.store("laptop")
+
+        work.record_session(1, "y")
+        laptop.record_session(2, "z")
+        self.client(work).sync_once()
+        self.client(laptop).sync_once()
+        self.client(work).sync_once()
+
+        self.assertNotEqual(work.device_id, laptop.device_id)
+        self.assertConverged([work, laptop], 3)
+        self.assertEqual(work.garden("_"), ["x", "y", "z", "_", "_"])
+
+        # The reassignment survives a reload
+        reloaded = HistoryStore(laptop.path)
+        self.assertEqual(reloaded.device_id, laptop.device_id)
+        self.assertEqual(reloaded.snapshot(), laptop.snapshot())
+
+    def test_idle_sync_does_not_rewrite_history(self):
+        s = self.store("idle")
+        s.record_session(0, "x")
+        client = self.client(s)
+        client.sync_once()
+        with mock.patch.object(HistoryStore, "_save") as save:
+            client.sync_once()
+        save.assert_not_called()
+
+
+class TestHistoryFile(SyncTestCase):
+    def load(self, content):
+        path = os.path.join(self.tmp, "history.json")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return HistoryStore(path)
+
+    def test_malformed_files_fall_back_to_defaults(self):
+        for content in [
+            "[]",
+            "not json",
+            json.dumps({"own_events": 5, "counts": [1], "garden": [1, "x", [[1, "d"], "f"]], "next_seq": "a"}),
+            json.dumps({"own_events": [[1, 2, 3]], "counts": {"a": "x"}, "cursor": -1}),
+        ]:
+            s = self.load(content)
+            self.assertEqual(s.session_count(), 0)
+            self.assertEqual(s.garden("_"), ["_"] * 5)
+            self.assertEqual(s.pending, [])
+            self.assertEqual(s.next_seq, 1)
+            self.assertEqual(s.cursor, 0)
+
+    def test_round_trip(self):
+        s = self.load("{}")
+        s.record_session(3, "x", ts=1.0)
+        reloaded = HistoryStore(s.path)
+        self.assertEqual(reloaded.snapshot(), s.snapshot())
+        self.assertEqual(reloaded.pending, [[1, 1.0, 3, "x"]])
+
+
+class TestWorker(SyncTestCase):
+    def test_backoff_delay_grows_and_caps(self):
+        with mock.patch("random.uniform", return_value=1.0):
+            delays = [pomodoro_sync.backoff_delay(n, base=2, cap=30) for n in range(1, 7)]
+        self.assertEqual(delays, [2, 4, 8, 16, 30, 30])
+
+    def test_unreachable_server_backs_off_and_recovers(self):
+        s = self.store("worker")
+        s.record_session(0, "x")
+        client = self.client(s, timeout=1)
+        real_url = client.url
+        client.url = "http://127.0.0.1:1/sync"
+
+        delays = []
+        def fake_backoff(failures):
+            delays.append(failures)
+            if failures == 3:
+                client.url = real_url
+            return 0.01
+
+        synced = threading.Event()
+        with mock.patch.object(pomodoro_sync, "backoff_delay", fake_backoff):
+            worker = SyncWorker(client, on_synced=synced.set, interval=0.05)
+            worker.start()
+            deadline = time.time() + 5
+            while s.pending and time.time() < deadline:
+                time.sleep(0.01)
+            worker.stop()
+            worker.join(5)
+
+        self.assertEqual(delays, [1, 2, 3])
+        self.assertEqual(s.pending, [])
+        self.assertFalse(worker.is_alive())
+
+    def test_unexpected_errors_do_not_kill_the_worker(self):
+        client = mock.Mock()
+        client.sync_once.side_effect = RuntimeError("boom")
+        with mock.patch.object(pomodoro_sync, "backoff_delay", return_value=0.01):
+            worker = SyncWorker(client, interval=0.05)
+            worker.start()
+            time.sleep(0.1)
+            self.assertTrue(worker.is_alive())
+            worker.stop()
+            worker.join(5)
+        self.assertGreater(client.sync_once.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()